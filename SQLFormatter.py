@@ -1,6 +1,7 @@
+import functools
 import json
 import re
-from typing import List
+from typing import Iterator, List, Match, Optional, Pattern, Tuple
 
 
 class SQLFormatter:
@@ -9,40 +10,176 @@ class SQLFormatter:
     """
 
     # Class-level regex patterns
+    # Only the column list is scanned, so telling INSERT ... SELECT from a long
+    # INSERT ... VALUES stops at the first ")" instead of walking every row
     INSERT_SELECT_PATTERN = re.compile(
-        r"INSERT\s+INTO\s+[^\s(]+\s*\(.*?\)\s*SELECT\b",
+        r"INSERT\s+INTO\s+[^\s(]+\s*\([^)]*\)\s*SELECT\b",
+        re.IGNORECASE,
+    )
+
+    # Leading-keyword dispatcher: each named group is the formatter for that statement type,
+    # so a single anchored match both classifies the statement and picks its handler.
+    # INSERT INTO ... SELECT is told apart from INSERT INTO ... VALUES after the match.
+    STATEMENT_DISPATCH_PATTERN = re.compile(
+        r"(?P<format_insert_values_block>INSERT\s+INTO)"
+        r"|(?P<format_set_block>SET\s+[@\w]+\s*[:=])"
+        r"|(?P<format_create_table>CREATE TABLE)"
+        r"|(?P<format_create_index>CREATE\s+(?:UNIQUE\s+)?INDEX)"
+        r"|(?P<format_alter_table>ALTER TABLE)"
+        r"|(?P<format_update_block>UPDATE)"
+        r"|(?P<format_delete_block>DELETE FROM)"
+        r"|(?P<format_simple_single_line>DROP TABLE|DROP INDEX)",
+        re.IGNORECASE,
+    )
+
+    # Statement splitting and cleanup patterns
+    # Tokens for _split_statements: quoted strings and comments are consumed whole so that a
+    # ";" followed by a newline only ends a statement when it is outside both. Inside quotes a
+    # backslash escapes the next character (MySQL, as in mysqldump's 'O\'Brien'). A quote or
+    # "/*" that never closes surfaces as "unterminated". "#" comments are recognised at the
+    # start of a line only, so "#tmp" tables and "#>>" operators are left alone.
+    STATEMENT_TOKEN_PATTERN = re.compile(
+        r"(?=['\"`;/#-])"
+        r"(?:'(?:[^'\\]|\\.)*'"
+        r'|"(?:[^"\\]|\\.)*"'
+        r"|`[^`]*`"
+        r"|--[^\n]*"
+        r"|(?<![^\n])#[^\n]*"
+        r"|/\*.*?\*/"
+        r"|(?P<statement_end>;\s*\n)"
+        r"|(?P<unterminated>['\"`]|/\*))",
+        re.DOTALL,
+    )
+    # The same tokens with backslashes read as ordinary characters and quotes escaped only by
+    # doubling ('it''s'), for text such as 'C:\' where the escape reading never closes
+    STATEMENT_LITERAL_TOKEN_PATTERN = re.compile(
+        r"(?=['\"`;/#-])"
+        r"(?:'(?:[^']|'')*'"
+        r'|"(?:[^"]|"")*"'
+        r"|`[^`]*`"
+        r"|--[^\n]*"
+        r"|(?<![^\n])#[^\n]*"
+        r"|/\*.*?\*/"
+        r"|(?P<statement_end>;\s*\n)"
+        r"|(?P<unterminated>['\"`]|/\*))",
+        re.DOTALL,
+    )
+    STATEMENT_END_PATTERN = re.compile(r";\s*\n")
+    LEADING_COMMENTS_PATTERN = re.compile(r"^(?:\s*(?:/\*.*?\*/|--[^\n]*))*", re.DOTALL)
+    NEWLINE_WHITESPACE_PATTERN = re.compile(r"\s*\n\s*")
+
+    # INSERT patterns. Column lists are matched with [^)]* rather than a lazy DOTALL .*?,
+    # so a failed match cannot run on past the statement and the engine never backtracks.
+    INSERT_TABLE_PATTERN = re.compile(r"INSERT\s+INTO\s+([^\s(]+)", re.IGNORECASE)
+    INSERT_VALUES_COLUMNS_PATTERN = re.compile(
+        r"INSERT\s+INTO\s+[^\s(]+\s*\(([^)]*)\)\s*VALUES", re.IGNORECASE
+    )
+    VALUES_BLOCK_PATTERN = re.compile(r"\)\s*VALUES\s*([\s\S]+?);", re.IGNORECASE | re.DOTALL)
+    INSERT_SELECT_COLUMNS_PATTERN = re.compile(
+        r"INSERT\s+INTO\s+[^\s(]+\s*\(([^)]*)\)\s*SELECT", re.IGNORECASE
+    )
+    SELECT_LIST_PATTERN = re.compile(r"SELECT\s+(.*?)\s+FROM\s", re.IGNORECASE | re.DOTALL)
+    FROM_KEYWORD_PATTERN = re.compile(r"\bFROM\b", re.IGNORECASE)
+    # One pass finds both INSERT forms; the "values" group tells them apart
+    INSERT_STATEMENT_PATTERN = re.compile(
+        r"INSERT\s+INTO\s+[^\s(]+\s*\([^)]*\)\s*"
+        r"(?:(?P<values>VALUES\s*\(.*?\))\s*;|SELECT\s+[^;]*?FROM[^;]*?;)",
         re.IGNORECASE | re.DOTALL,
     )
-    INSERT_INTO_PATTERN = re.compile(r"^INSERT\s+INTO", re.IGNORECASE)
-    SET_PATTERN = re.compile(r"^SET\s+[@\w]+\s*[:=]", re.IGNORECASE)
-    CREATE_TABLE_PATTERN = re.compile(r"^CREATE TABLE", re.IGNORECASE)
-    CREATE_INDEX_PATTERN = re.compile(r"^CREATE\s+(?:UNIQUE\s+)?INDEX", re.IGNORECASE)
-    ALTER_TABLE_PATTERN = re.compile(r"^ALTER TABLE", re.IGNORECASE)
-    UPDATE_PATTERN = re.compile(r"^UPDATE", re.IGNORECASE)
-    DELETE_FROM_PATTERN = re.compile(r"^DELETE FROM", re.IGNORECASE)
-    DROP_PATTERN = re.compile(r"^(DROP TABLE|DROP INDEX)", re.IGNORECASE)
+
+    # DDL patterns
+    CREATE_TABLE_BODY_PATTERN = re.compile(
+        r"(CREATE\s+TABLE\s+[^\(]+)\s*\((.*)\)\s*", re.IGNORECASE | re.DOTALL
+    )
+    CREATE_INDEX_PREFIX_PATTERN = re.compile(
+        r"(CREATE\s+(?:UNIQUE\s+)?INDEX\s+[^\s(]+?\s+ON\s+[^\s(]+)", re.IGNORECASE
+    )
+    ALTER_TABLE_HEADER_PATTERN = re.compile(r"(ALTER\s+TABLE\s+[^\s]+)\s+(.*)", re.IGNORECASE | re.DOTALL)
+
+    # UPDATE / SET / DELETE patterns
+    UPDATE_STATEMENT_PATTERN = re.compile(
+        r"UPDATE\s+([^\s]+)\s+SET\s+(.*?)(?:\s+WHERE\s+(.*?))?;", re.IGNORECASE | re.DOTALL
+    )
+    SET_LINE_PATTERN = re.compile(r"^\s*SET\s+(@?[A-Z0-9_]+)\s*([:=]{1,2})\s*(.+?)\s*;?\s*$", re.IGNORECASE)
+    EMBEDDED_JSON_PATTERN = re.compile(r"(=)\s*('?)\s*(\{)", re.IGNORECASE)
+    # Only escapes, double quotes and braces matter when skipping an unparsable {...} block
+    JSON_BRACE_TOKEN_PATTERN = re.compile(r'\\["\\]?|"|[{}]')
+    DELETE_TABLE_PATTERN = re.compile(r"DELETE\s+FROM\s+([^\s;]+)", re.IGNORECASE)
+    WHERE_KEYWORD_PATTERN = re.compile(r"\bWHERE\b", re.IGNORECASE)
+    AND_KEYWORD_PATTERN = re.compile(r"\s+AND\s+", re.IGNORECASE)
+
+    # CASE expression patterns
+    CASE_BLOCK_PATTERN = re.compile(r"CASE\b.*?END\b", re.IGNORECASE | re.DOTALL)
+    WHEN_THEN_PATTERN = re.compile(
+        r"WHEN\s+(?P<cond>.+?)\s+THEN\s+(?P<res>.+?)(?=(?:WHEN|ELSE|$))", re.IGNORECASE | re.DOTALL
+    )
+    ELSE_PATTERN = re.compile(r"ELSE\s+(?P<else>.+)$", re.IGNORECASE | re.DOTALL)
+    IN_LIST_PATTERN = re.compile(r"(.+?\bIN)\s*\((.+)\)$", re.IGNORECASE | re.DOTALL)
+
+    # Comma splitters
+    # Tokens for the comma splitters: a quoted string, a backslash escape, or a single
+    # bracket or comma. Everything else is skipped by the regex engine without surfacing a
+    # match. Quotes follow the same rule as STATEMENT_TOKEN_PATTERN (see _quote_aware_tokens).
+    CSV_TOKEN_PATTERN = re.compile(
+        r"'(?:[^'\\]|\\.)*'"
+        r'|"(?:[^"\\]|\\.)*"'
+        r"|\\.?"
+        r"|[(){}\[\],]"
+        r"|(?P<unterminated>['\"])",
+        re.DOTALL,
+    )
+    # Backslashes read literally; a quote that never closes runs to the end of the text
+    CSV_LITERAL_TOKEN_PATTERN = re.compile(
+        r"'(?:[^']|'')*'?"
+        r'|"(?:[^"]|"")*"?'
+        r"|[(){}\[\],]",
+        re.DOTALL,
+    )
+
+    # Shared encoder for pretty-printed JSON; json.dumps(..., indent=4) builds a new one per call
+    PRETTY_JSON_ENCODER = json.JSONEncoder(indent=4)
+    JSON_DECODER = json.JSONDecoder()
 
     # Indentation constants
     INDENT_1 = "    "
     INDENT_2 = "  "
 
-    # Mapping of patterns to formatting methods
-    _DISPATCH_MAP = [
-        (INSERT_SELECT_PATTERN, "format_insert_select_block"),
-        (INSERT_INTO_PATTERN, "format_insert_values_block"),
-        (SET_PATTERN, "format_set_block"),
-        (CREATE_TABLE_PATTERN, "format_create_table"),
-        (CREATE_INDEX_PATTERN, "format_create_index"),
-        (ALTER_TABLE_PATTERN, "format_alter_table"),
-        (UPDATE_PATTERN, "format_update_block"),
-        (DELETE_FROM_PATTERN, "format_delete_block"),
-        (DROP_PATTERN, "format_simple_single_line"),
-    ]
+    # format_all results are memoised for inputs up to this many characters
+    FORMAT_CACHE_MAX_INPUT = 64_000
+
+    # Pretty-printed JSON keyed on its source text (same size bound as format_all's cache);
+    # batched UPDATEs often repeat one payload and indented encoding is the slow part
+    PRETTY_JSON_CACHE_SIZE = 256
+    _pretty_json_cache = {}
 
     @staticmethod
     def _collapse_whitespace(text: str) -> str:
         """Collapse all repeated whitespace characters into a single space."""
-        return re.sub(r"\s+", " ", text).strip()
+        return " ".join(text.split())
+
+    @staticmethod
+    def _strip_block_comments(text: str) -> str:
+        """
+        Remove every closed /* ... */ comment; an unclosed "/*" and the text after it are kept.
+
+        :param text: SQL text that may contain block comments.
+        :return: The text without its block comments.
+        """
+        start = text.find("/*")
+        if start == -1:
+            return text
+
+        pieces = []
+        pos = 0
+        while start != -1:
+            end = text.find("*/", start + 2)
+            if end == -1:
+                break
+            pieces.append(text[pos:start])
+            pos = end + 2
+            start = text.find("/*", pos)
+        pieces.append(text[pos:])
+        return "".join(pieces)
 
     @staticmethod
     def _trim_semicolon(text: str) -> str:
@@ -59,8 +196,26 @@ class SQLFormatter:
         :param pretty_json: Whether to pretty-print embedded JSON within UPDATE statements.
         :return: A formatted SQL string with blocks separated by blank lines.
         """
+        if len(sql) > SQLFormatter.FORMAT_CACHE_MAX_INPUT:
+            return SQLFormatter._format_all_uncached(sql, pretty_json)
+        return SQLFormatter._format_all_cached(sql, pretty_json)
+
+    @staticmethod
+    def clear_format_cache() -> None:
+        """Drop all memoised format_all, INSERT header and pretty-printed JSON results."""
+        SQLFormatter._format_all_cached.cache_clear()
+        SQLFormatter._insert_values_header.cache_clear()
+        SQLFormatter._pretty_json_cache.clear()
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _format_all_cached(sql: str, pretty_json: bool) -> str:
+        return SQLFormatter._format_all_uncached(sql, pretty_json)
+
+    @staticmethod
+    def _format_all_uncached(sql: str, pretty_json: bool) -> str:
         sql = sql.strip()
-        parts = re.split(r";\s*\n", sql, flags=re.DOTALL)
+        parts = SQLFormatter._split_statements(sql)
         if not parts or (len(parts) == 1 and not parts[0].strip()):
             return ""
         formatted_blocks = []
@@ -70,33 +225,88 @@ class SQLFormatter:
             if not part_content:
                 continue
 
-            cleaned = re.sub(r"^(?:\s*(?:/\*.*?\*/|--[^\n]*))*", "", part_content,
-                             flags=re.DOTALL)
-
-            upper_part = cleaned.upper()
-
-            # Dispatch based on the first matching pattern
+            # Dispatch on the leading keyword only, matching past any leading comments in place
+            # rather than copying the statement without them; the body is never rescanned
+            keyword_at = SQLFormatter.LEADING_COMMENTS_PATTERN.match(part_content).end()
             handler_name = None
-            for pattern, method_name in SQLFormatter._DISPATCH_MAP:
-                subject = cleaned if pattern is SQLFormatter.INSERT_SELECT_PATTERN else upper_part
-                if pattern.search(subject):
-                    handler_name = method_name
-                    break
+            dispatch_m = SQLFormatter.STATEMENT_DISPATCH_PATTERN.match(part_content, keyword_at)
+            if dispatch_m:
+                handler_name = dispatch_m.lastgroup
+                if (handler_name == "format_insert_values_block"
+                        and SQLFormatter.INSERT_SELECT_PATTERN.match(part_content, keyword_at)):
+                    handler_name = "format_insert_select_block"
+
+            # Only the final statement can still carry its ";"; copy the others to terminate them
+            if not part_content.endswith(";"):
+                part_content += ";"
 
             if handler_name:
                 method = getattr(SQLFormatter, handler_name)
-                formatted_part = method(part_content + ";")
+                formatted_part = method(part_content)
                 if handler_name == "format_update_block" and pretty_json:
                     formatted_part = SQLFormatter._format_embedded_json(formatted_part)
             else:
-                formatted_part = part_content if part_content.endswith(";") else part_content + ";"
+                formatted_part = part_content
 
             formatted_part = SQLFormatter.format_case_expression(formatted_part)
-            formatted_part = re.sub(r";{2,}$", ";", formatted_part)
+            # Handlers that echo the statement keep its ";" and the one added above
+            if formatted_part.endswith(";;"):
+                formatted_part = formatted_part.rstrip(";") + ";"
             formatted_blocks.append(formatted_part)
 
         return "\n\n".join(formatted_blocks)
 
+    @staticmethod
+    def _quote_aware_tokens(text: str, escaped_pattern: Pattern, literal_pattern: Pattern) -> Iterator[Match]:
+        """
+        Tokenise text with the one quoting rule every scanner in this module shares: inside
+        quotes a backslash escapes the next character (MySQL), unless reading it that way
+        leaves a quote unclosed, as with 'C:\\'; then backslashes are ordinary characters.
+
+        :param text: The text to scan.
+        :param escaped_pattern: Token pattern reading backslash escapes, with an "unterminated" group.
+        :param literal_pattern: The same tokens with backslashes read literally.
+        :return: An iterator over the token matches.
+        """
+        # Without a backslash both readings agree
+        if "\\" in text and not any(
+            token_m.lastgroup == "unterminated" for token_m in escaped_pattern.finditer(text)
+        ):
+            return escaped_pattern.finditer(text)
+        return literal_pattern.finditer(text)
+
+    @staticmethod
+    def _split_statements(sql: str) -> List[str]:
+        """
+        Split SQL text at each ";" that is followed by a newline, ignoring any that sit
+        inside quoted strings, backtick identifiers or comments. Quotes follow
+        _quote_aware_tokens; if a quote or block comment is still never closed, every ";"
+        followed by a newline splits.
+
+        :param sql: The raw SQL input containing one or more statements.
+        :return: The statement texts without their terminating semicolons.
+        """
+        # A single statement (the usual case) has no ";" with a newline anywhere after it
+        semicolon_at = sql.find(";")
+        if semicolon_at == -1 or sql.find("\n", semicolon_at) == -1:
+            return [sql]
+
+        parts = []
+        start = 0
+        tokens = SQLFormatter._quote_aware_tokens(
+            sql, SQLFormatter.STATEMENT_TOKEN_PATTERN, SQLFormatter.STATEMENT_LITERAL_TOKEN_PATTERN
+        )
+        for token_m in tokens:
+            if token_m.lastgroup == "statement_end":
+                parts.append(sql[start:token_m.start()])
+                start = token_m.end()
+            elif token_m.lastgroup == "unterminated":
+                # An unclosed quote or comment would swallow every later statement;
+                # fall back to splitting at each ";" + newline regardless of context
+                return SQLFormatter.STATEMENT_END_PATTERN.split(sql)
+        parts.append(sql[start:])
+        return parts
+
     @staticmethod
     def format_insert_values_block(sql: str) -> str:
         """
@@ -106,20 +316,12 @@ class SQLFormatter:
         :param sql: The full INSERT statement ending with a semicolon.
         :return: A pretty-printed INSERT statement or an error string on mismatch.
         """
-        table_m = re.search(r"INSERT\s+INTO\s+([^\s(]+)", sql, re.IGNORECASE)
-        cols_m = re.search(
-            r"INSERT\s+INTO\s+[^\s(]+\s*\((.*?)\)\s*VALUES",
-            sql,
-            re.DOTALL | re.IGNORECASE
-        )
+        table_m = SQLFormatter.INSERT_TABLE_PATTERN.search(sql)
+        cols_m = SQLFormatter.INSERT_VALUES_COLUMNS_PATTERN.search(sql)
         if not cols_m:
             return "❌ Invalid INSERT statement structure (columns not found)."
 
-        values_block_m = re.search(
-            r"\)\s*VALUES\s*([\s\S]+?);",  # note the leading \)
-            sql,
-            re.IGNORECASE | re.DOTALL,
-        )
+        values_block_m = SQLFormatter.VALUES_BLOCK_PATTERN.search(sql)
         if not values_block_m:
             return "❌ VALUES clause not found."
 
@@ -127,33 +329,17 @@ class SQLFormatter:
             return "❌ Invalid INSERT statement structure. Could not identify table, columns, or VALUES clause."
 
         table_name = table_m.group(1)
-        cols_str = cols_m.group(1)
-        cols = [c.strip() for c in cols_str.split(",")]
+        cols, header = SQLFormatter._insert_values_header(table_name, cols_m.group(1))
 
         values_content_raw = values_block_m.group(1).strip()
-        values_content_raw = re.sub(r"/\*.*?\*/", "", values_content_raw, flags=re.DOTALL)
-
-        individual_row_strings_content = []
+        values_content_raw = SQLFormatter._strip_block_comments(values_content_raw)
 
-        temp_delimiter = "<ROW_DELIMITER_TEMP_VALS>"
-        processed_for_split = re.sub(r"\)\s*,\s*\(", f"){temp_delimiter}(", values_content_raw)
-
-        if temp_delimiter in processed_for_split:
-            row_parts_with_parens = processed_for_split.split(temp_delimiter)
-        else:
-            row_parts_with_parens = [values_content_raw]
-
-        for row_part_with_parens in row_parts_with_parens:
-            row_part_stripped = row_part_with_parens.strip()
-            if row_part_stripped.startswith("(") and row_part_stripped.endswith(")"):
-                individual_row_strings_content.append(row_part_stripped[1:-1].strip())
-            elif not row_part_stripped:
-                continue
-            else:
-                return (
-                    "❌ Error parsing rows in VALUES. Ensure rows are correctly parenthesized "
-                    "and separated by commas (e.g., VALUES (r1v1, r1v2), (r2v1, r2v2))."
-                )
+        individual_row_strings_content = SQLFormatter._split_value_rows(values_content_raw)
+        if individual_row_strings_content is None:
+            return (
+                "❌ Error parsing rows in VALUES. Ensure rows are correctly parenthesized "
+                "and separated by commas (e.g., VALUES (r1v1, r1v2), (r2v1, r2v2))."
+            )
 
         if not individual_row_strings_content:
             if values_content_raw == "()":
@@ -167,23 +353,22 @@ class SQLFormatter:
             return f"❌ No value rows found in VALUES clause for table '{table_name}'."
 
         indent = SQLFormatter.INDENT_1
-        output_lines = [f"INSERT INTO {table_name} ("]
-        for i, col in enumerate(cols):
-            comma = "," if i < len(cols) - 1 else ""
-            output_lines.append(f"{indent}{col}{comma}")
+        output_lines = [header]
 
-        output_lines.append(") VALUES")
+        # Per-row fragments are loop-invariant; build them once rather than once per row
+        inner_indent = indent + SQLFormatter.INDENT_1
+        first_row_open, row_open, row_close = f"{indent}(", f"{indent},(", f"{indent})"
 
         for row_idx, row_values_str_content in enumerate(individual_row_strings_content):
-            normalized_row_values_str = re.sub(r"\s*\n\s*", " ", row_values_str_content.strip())
-            vals_for_this_row = SQLFormatter.smart_split_csv(normalized_row_values_str)
+            # Split first and only normalise the values that actually span lines
+            vals_for_this_row = [
+                SQLFormatter.NEWLINE_WHITESPACE_PATTERN.sub(" ", v) if "\n" in v else v
+                for v in SQLFormatter.smart_split_csv(row_values_str_content)
+            ]
 
             if not vals_for_this_row and not cols:
-                if row_idx == 0:
-                    output_lines.append(f"{indent}(")
-                else:
-                    output_lines.append(f"{indent},(")
-                output_lines.append(f"{indent})")
+                output_lines.append(first_row_open if row_idx == 0 else row_open)
+                output_lines.append(row_close)
                 continue
             elif not vals_for_this_row and cols:
                 return (
@@ -198,34 +383,83 @@ class SQLFormatter:
                     f"    But found {len(vals_for_this_row)} values: {', '.join(vals_for_this_row)}"
                 )
 
-            if row_idx == 0:
-                output_lines.append(f"{indent}(")
-            else:
-                output_lines.append(f"{indent},(")
-
-            val_comma_for_this_row = [
-                vals_for_this_row[i] + ("," if i < len(vals_for_this_row) - 1 else "")
-                for i in range(len(vals_for_this_row))
-            ]
+            output_lines.append(first_row_open if row_idx == 0 else row_open)
 
-            max_len_for_this_row = max((len(v) for v in val_comma_for_this_row), default=0)
-            inner_indent = indent + SQLFormatter.INDENT_1
+            # Widest value including its trailing comma (every value but the last gets one)
+            last_value = vals_for_this_row[-1]
+            max_len_for_this_row = max(
+                max(map(len, vals_for_this_row[:-1]), default=-1) + 1,
+                len(last_value),
+            )
 
-            for v_idx, v_with_comma in enumerate(val_comma_for_this_row):
-                col_name = cols[v_idx]
-                pad_val = max_len_for_this_row - len(v_with_comma)
-                if not v_with_comma.endswith(","):
-                    pad_val += 1
-                pad_val = max(0, pad_val)
-                output_lines.append(f"{inner_indent}{v_with_comma}{' ' * (pad_val + 1)}-- {col_name}")
+            # Every value but the last takes a comma, so all of them share one width
+            width = max_len_for_this_row + 1
+            output_lines.extend([
+                f"{inner_indent}{value + ',':<{width}}-- {col_name}"
+                for value, col_name in zip(vals_for_this_row[:-1], cols)
+            ])
+            # Comments line up one column further out on values without a trailing comma
+            width = max_len_for_this_row + (1 if last_value.endswith(",") else 2)
+            output_lines.append(f"{inner_indent}{last_value:<{width}}-- {cols[-1]}")
 
-            output_lines.append(f"{indent})")
+            output_lines.append(row_close)
 
         if output_lines and not output_lines[-1].endswith(";"):
             output_lines[-1] = output_lines[-1] + ";"
 
         return "\n".join(output_lines)
 
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _insert_values_header(table_name: str, cols_str: str) -> Tuple[Tuple[str, ...], str]:
+        """
+        Parse an INSERT column list and build the header lines that precede its rows.
+        Bulk dumps repeat the same table and column list on every statement, so both are cached.
+
+        :param table_name: The target table of the INSERT.
+        :param cols_str: The raw text between the column-list parentheses.
+        :return: The stripped column names and the "INSERT INTO ... ) VALUES" header.
+        """
+        cols = tuple(c.strip() for c in cols_str.split(","))
+        indent = SQLFormatter.INDENT_1
+        column_block = f",\n{indent}".join(cols)
+        return cols, f"INSERT INTO {table_name} (\n{indent}{column_block}\n) VALUES"
+
+    @staticmethod
+    def _split_value_rows(values: str) -> Optional[List[str]]:
+        """
+        Split the body of a VALUES clause into the contents of its parenthesised rows,
+        ignoring parentheses and commas inside quoted strings or nested calls.
+
+        :param values: The text following VALUES, e.g. "(1, 'a'), (2, 'b')".
+        :return: The stripped inner text of each row, or None if the body is not a
+                 comma-separated list of parenthesised rows.
+        """
+        rows = []
+        depth = 0
+        row_start = 0
+        row_end = 0
+        for token_m in SQLFormatter._csv_tokens(values):
+            token = token_m.group()
+            if token == "(":
+                if depth == 0:
+                    # Only a single comma may sit between two rows
+                    if values[row_end:token_m.start()].strip() != ("," if rows else ""):
+                        return None
+                    row_start = token_m.end()
+                depth += 1
+            elif token == ")":
+                if depth == 0:
+                    return None
+                depth -= 1
+                if depth == 0:
+                    rows.append(values[row_start:token_m.start()].strip())
+                    row_end = token_m.end()
+
+        if depth or values[row_end:].strip():
+            return None
+        return rows
+
     @staticmethod
     def format_insert_select_block(sql: str) -> str:
         """
@@ -235,53 +469,42 @@ class SQLFormatter:
         :param sql: The full INSERT...SELECT statement ending with a semicolon.
         :return: A pretty-printed INSERT...SELECT statement or an error string on mismatch.
         """
-        table_m = re.search(r"INSERT\s+INTO\s+([^\s(]+)", sql, re.IGNORECASE)
-        cols_m = re.search(
-            r"INSERT\s+INTO\s+[^\s(]+\s*\((.*?)\)\s*SELECT", sql, re.DOTALL | re.IGNORECASE
-        )
-        select_m = re.search(r"SELECT\s+(.*?)\s+FROM\s", sql, re.DOTALL | re.IGNORECASE)
+        table_m = SQLFormatter.INSERT_TABLE_PATTERN.search(sql)
+        cols_m = SQLFormatter.INSERT_SELECT_COLUMNS_PATTERN.search(sql)
+        select_m = SQLFormatter.SELECT_LIST_PATTERN.search(sql)
 
         if not table_m or not cols_m or not select_m:
             return "❌ Invalid format. Expecting INSERT INTO <table>(...) SELECT ..."
 
         table_name = table_m.group(1)
         cols = [c.strip() for c in cols_m.group(1).split(",")]
-        selects = [
-            s.strip() for s in re.split(r",(?![^()]*\))", select_m.group(1))
-        ]
+        selects = SQLFormatter._split_top_level_commas(select_m.group(1))
 
         if len(cols) != len(selects):
             return f"❌ Column/select count mismatch ({len(cols)} vs {len(selects)})."
 
         indent = SQLFormatter.INDENT_1
-        sel_comma = [selects[i] + ("," if i < len(selects) - 1 else "") for i in range(len(selects))]
-        max_len = max((len(s) for s in sel_comma), default=0)
-
-        lines = [f"INSERT INTO {table_name} ("]
-        for i, col in enumerate(cols):
-            comma = "," if i < len(cols) - 1 else ""
-            lines.append(f"{indent}{col}{comma}")
-        lines.append(") SELECT")
-
-        for i, s in enumerate(sel_comma):
-            lines.append(f"{indent}{s.ljust(max_len)}  -- {cols[i]}")
-
-        rest = sql[sql.upper().find("FROM"):]
+        max_len = max(max(map(len, selects[:-1]), default=-1) + 1, len(selects[-1]))
+
+        column_block = f",\n{indent}".join(cols)
+        lines = [f"INSERT INTO {table_name} (\n{indent}{column_block}\n) SELECT"]
+        lines.extend([
+            f"{indent}{select_item + ',':<{max_len}}  -- {col}"
+            for select_item, col in zip(selects[:-1], cols)
+        ])
+        lines.append(f"{indent}{selects[-1]:<{max_len}}  -- {cols[-1]}")
+
+        from_m = SQLFormatter.FROM_KEYWORD_PATTERN.search(sql, select_m.end(1))
+        rest = sql[from_m.start():]
         lines.append(rest.strip())
         return "\n".join(lines)
 
     @staticmethod
     def extract_insert_statements(sql: str) -> List[str]:
-        insert_values = re.findall(
-            r"INSERT\s+INTO\s+[^\s(]+\s*\(.*?\)\s*VALUES\s*\(.*?\);",
-            sql,
-            re.DOTALL | re.IGNORECASE,
-        )
-        insert_selects = re.findall(
-            r"INSERT\s+INTO\s+[^\s(]+\s*\([^)]*\)\s*SELECT\s+[^;]*?FROM[^;]*?;",
-            sql,
-            re.DOTALL | re.IGNORECASE,
-        )
+        insert_values = []
+        insert_selects = []
+        for m in SQLFormatter.INSERT_STATEMENT_PATTERN.finditer(sql):
+            (insert_values if m.lastgroup else insert_selects).append(m.group(0))
         return insert_values + insert_selects
 
     @staticmethod
@@ -293,27 +516,19 @@ class SQLFormatter:
         :return: A single-line or multi-line formatted CREATE TABLE statement.
         """
         stripped = SQLFormatter._trim_semicolon(sql)
-        m = re.match(
-            r"(CREATE\s+TABLE\s+[^\(]+)\s*\((.*)\)\s*",
-            stripped,
-            flags=re.IGNORECASE | re.DOTALL,
-        )
+        m = SQLFormatter.CREATE_TABLE_BODY_PATTERN.match(stripped)
         if not m:
             return sql.strip()
 
         header = SQLFormatter._collapse_whitespace(m.group(1))
         body = m.group(2).strip()
-        cols = [c.strip() for c in re.split(r",(?![^(]*\))", body)]
-        if len(cols) == 1:
-            return re.sub(r"\s+", " ", sql.strip()) + ";"
+        cols = SQLFormatter._split_top_level_commas(body)
+        if len(cols) <= 1:
+            return " ".join(sql.split()) + ";"
 
         indent = SQLFormatter.INDENT_1
-        out = [f"{header} ("]
-        for i, col in enumerate(cols):
-            comma = "," if i < len(cols) - 1 else ""
-            out.append(f"{indent}{col}{comma}")
-        out.append(");")
-        return "\n".join(out)
+        column_block = f",\n{indent}".join(cols)
+        return f"{header} (\n{indent}{column_block}\n);"
 
     @staticmethod
     def format_create_index(sql: str) -> str:
@@ -321,11 +536,7 @@ class SQLFormatter:
         Format a CREATE [UNIQUE] INDEX statement, expanding column lists vertically.
         """
         stripped = SQLFormatter._trim_semicolon(sql)
-        prefix_match = re.match(
-            r"(CREATE\s+(?:UNIQUE\s+)?INDEX\s+[^\s(]+?\s+ON\s+[^\s(]+)",
-            stripped,
-            flags=re.IGNORECASE,
-        )
+        prefix_match = SQLFormatter.CREATE_INDEX_PREFIX_PATTERN.match(stripped)
         if not prefix_match:
             return sql.strip()
 
@@ -377,7 +588,7 @@ class SQLFormatter:
         so each column definition appears on its own line.
         """
         stripped = SQLFormatter._trim_semicolon(sql)
-        m = re.match(r"(ALTER\s+TABLE\s+[^\s]+)\s+(.*)", stripped, flags=re.IGNORECASE | re.DOTALL)
+        m = SQLFormatter.ALTER_TABLE_HEADER_PATTERN.match(stripped)
         if not m:
             return sql.strip()
 
@@ -412,27 +623,38 @@ class SQLFormatter:
                     return prefix, body, suffix
         return None
 
+    @staticmethod
+    def _csv_tokens(text: str) -> Iterator[Match]:
+        """
+        Tokenise text for the comma splitters.
+
+        :param text: A comma-separated list, possibly with quoted strings and brackets.
+        :return: An iterator over the quoted-string, bracket and comma matches.
+        """
+        return SQLFormatter._quote_aware_tokens(
+            text, SQLFormatter.CSV_TOKEN_PATTERN, SQLFormatter.CSV_LITERAL_TOKEN_PATTERN
+        )
+
     @staticmethod
     def _split_top_level_commas(text: str):
         parts = []
-        current = []
+        start = 0
         depth = 0
-        for char in text:
+        # One linear pass over the comma splitters' tokens: quoted strings arrive whole, so a
+        # bracket or comma inside a literal never counts; the text in between is sliced out
+        for token_m in SQLFormatter._csv_tokens(text):
+            char = token_m.group()
             if char == "(":
                 depth += 1
             elif char == ")":
                 depth = max(0, depth - 1)
-
-            if char == "," and depth == 0:
-                piece = "".join(current).strip()
+            elif char == "," and depth == 0:
+                piece = text[start:token_m.start()].strip()
                 if piece:
                     parts.append(piece)
-                current = []
-                continue
-
-            current.append(char)
+                start = token_m.end()
 
-        tail = "".join(current).strip()
+        tail = text[start:].strip()
         if tail:
             parts.append(tail)
         return parts
@@ -475,11 +697,7 @@ class SQLFormatter:
         """
         joined = SQLFormatter._collapse_whitespace(sql)
 
-        m = re.match(
-            r"UPDATE\s+([^\s]+)\s+SET\s+(.*?)(?:\s+WHERE\s+(.*?))?;",
-            joined,
-            flags=re.IGNORECASE | re.DOTALL,
-        )
+        m = SQLFormatter.UPDATE_STATEMENT_PATTERN.match(joined)
         if not m:
             return sql.strip()
 
@@ -487,7 +705,7 @@ class SQLFormatter:
         assigns = m.group(2).strip()
         where_clause = m.group(3).strip() if m.group(3) else None
 
-        parts = [p.strip() for p in re.split(r",(?=(?:[^']*'[^']*')*[^']*$)", assigns)]
+        parts = SQLFormatter.smart_split_csv(assigns)
 
         indent = SQLFormatter.INDENT_2
         out = [f"UPDATE {table}", f"{indent}SET"]
@@ -509,20 +727,40 @@ class SQLFormatter:
         if where_clause:
             out.append(f"WHERE {where_clause};")
         else:
-            out.append(";")
+            out[-1] += ";"
 
-        result = "\n".join(out)
-        result = re.sub(r"\n;$", ";", result)
-        return result
+        return "\n".join(out)
 
     @staticmethod
     def format_json_like_sql_field(field: str) -> str:
         try:
-            parsed = json.loads(field)
-            return json.dumps(parsed, indent=4)
-        except json.JSONDecodeError:
+            return SQLFormatter._pretty_json(field)
+        except (ValueError, TypeError):
+            # TypeError: field is not JSON text at all (e.g. None from an empty cell)
             return field
 
+    @staticmethod
+    def _pretty_json(raw: str, parsed=None) -> str:
+        """
+        Re-encode JSON text with 4-space indentation, reusing earlier results for the same text.
+
+        :param raw: The JSON source text.
+        :param parsed: The already-decoded value of raw, if the caller has it.
+        :return: The indented JSON.
+        :raises ValueError: If raw is not valid JSON.
+        """
+        cache = SQLFormatter._pretty_json_cache
+        pretty = cache.get(raw)
+        if pretty is None:
+            if parsed is None:
+                parsed = json.loads(raw)
+            pretty = SQLFormatter.PRETTY_JSON_ENCODER.encode(parsed)
+            if len(raw) <= SQLFormatter.FORMAT_CACHE_MAX_INPUT:
+                if len(cache) >= SQLFormatter.PRETTY_JSON_CACHE_SIZE:
+                    cache.pop(next(iter(cache)))
+                cache[raw] = pretty
+        return pretty
+
     @staticmethod
     def format_set_block(sql: str) -> str:
         """
@@ -532,27 +770,22 @@ class SQLFormatter:
         :param sql: One or more SET statements, each optionally ending with semicolon.
         :return: A formatted multiline SET block or the original SQL on mismatch/JSON.
         """
-        lines = sql.strip().splitlines()
-        set_pattern = re.compile(
-            r"^\s*SET\s+(@?[A-Z0-9_]+)\s*([:=]{1,2})\s*(.+?);?\s*$",
-            re.IGNORECASE,
-        )
-        if not all(set_pattern.match(l) for l in lines):
-            return sql
-
+        set_pattern = SQLFormatter.SET_LINE_PATTERN
         parsed = []
-        for line in lines:
+        max_lhs = 0
+        # One match per line; bail out on the first line that is not a plain SET
+        for line in sql.strip().splitlines():
             m = set_pattern.match(line)
-            lhs, op, rhs = m.group(1), m.group(2), m.group(3).strip().rstrip(";")
-            if rhs.startswith("{") or rhs.startswith("["):
+            if not m:
+                return sql
+            lhs, op, rhs = m.group(1), m.group(2), m.group(3).rstrip(";")
+            if rhs.startswith(("{", "[")):
                 return sql
+            if len(lhs) > max_lhs:
+                max_lhs = len(lhs)
             parsed.append((lhs, op, rhs))
 
-        max_lhs = max(len(lhs) for lhs, _, _ in parsed)
-        out = []
-        for lhs, op, rhs in parsed:
-            out.append(f"SET {lhs.ljust(max_lhs)} {op} {rhs};")
-        return "\n".join(out)
+        return "\n".join(f"SET {lhs.ljust(max_lhs)} {op} {rhs};" for lhs, op, rhs in parsed)
 
     @staticmethod
     def _format_embedded_json(stmt: str) -> str:
@@ -563,29 +796,28 @@ class SQLFormatter:
         :param stmt: The UPDATE statement potentially containing JSON.
         :return: The statement with pretty-printed JSON sections.
         """
+        # Every match of EMBEDDED_JSON_PATTERN contains "{", quoted or not
+        if "{" not in stmt:
+            return stmt
 
         def find_balanced_json(text: str, start: int) -> int:
             brace_level = 0
             in_str = False
-            escape = False
-            for i in range(start, len(text)):
-                c = text[i]
-                if c == "\\" and not escape:
-                    escape = True
-                    continue
-                if c == '"' and not escape:
+            for token_m in SQLFormatter.JSON_BRACE_TOKEN_PATTERN.finditer(text, start):
+                c = token_m.group()
+                if c == '"':
                     in_str = not in_str
-                elif not in_str:
-                    if c == "{":
-                        brace_level += 1
-                    elif c == "}":
-                        brace_level -= 1
-                        if brace_level == 0:
-                            return i
-                escape = False
+                elif in_str or c[0] == "\\":
+                    continue
+                elif c == "{":
+                    brace_level += 1
+                else:
+                    brace_level -= 1
+                    if brace_level == 0:
+                        return token_m.start()
             return -1
 
-        pattern = re.compile(r"(=)\s*('?)\s*(\{)", re.IGNORECASE)
+        pattern = SQLFormatter.EMBEDDED_JSON_PATTERN
         offset = 0
         while True:
             match = pattern.search(stmt, offset)
@@ -594,23 +826,24 @@ class SQLFormatter:
             has_quote = bool(match.group(2))
             start_json = match.start(3)
             start_replace = start_json if not has_quote else match.start(2)
-            end_json = find_balanced_json(stmt, start_json)
-            if end_json == -1:
-                break
-
-            json_str = stmt[start_json : end_json + 1]
             try:
-                parsed = json.loads(json_str)
-                pretty = json.dumps(parsed, indent=4)
-                replacement = pretty
-                end_index = end_json + 1
-                if has_quote and end_index < len(stmt) and stmt[end_index] == "'":
-                    end_index += 1
-                    replacement = "'" + pretty + "'"
-                stmt = stmt[:start_replace] + replacement + stmt[end_index:]
-                offset = start_replace + len(replacement)
-            except json.JSONDecodeError:
+                # raw_decode finds the end of the object while parsing it, all in C
+                parsed, end_index = SQLFormatter.JSON_DECODER.raw_decode(stmt, start_json)
+            except ValueError:
+                # Not valid JSON: skip past the balanced braces and keep looking
+                end_json = find_balanced_json(stmt, start_json)
+                if end_json == -1:
+                    break
                 offset = end_json + 1
+                continue
+
+            pretty = SQLFormatter._pretty_json(stmt[start_json:end_index], parsed)
+            replacement = pretty
+            if has_quote and end_index < len(stmt) and stmt[end_index] == "'":
+                end_index += 1
+                replacement = "'" + pretty + "'"
+            stmt = stmt[:start_replace] + replacement + stmt[end_index:]
+            offset = start_replace + len(replacement)
         return stmt
 
     @staticmethod
@@ -633,13 +866,13 @@ class SQLFormatter:
         :return: A pretty-printed DELETE statement or original SQL if no WHERE.
         """
         lines = ["DELETE FROM"]
-        delete_match = re.match(r"DELETE\s+FROM\s+([^\s;]+)", sql, re.IGNORECASE)
-        where_clause = re.split(r"\bWHERE\b", sql, maxsplit=1, flags=re.IGNORECASE)
+        delete_match = SQLFormatter.DELETE_TABLE_PATTERN.match(sql)
+        where_clause = SQLFormatter.WHERE_KEYWORD_PATTERN.split(sql, maxsplit=1)
         if delete_match:
             table = delete_match.group(1)
             lines[0] = f"DELETE FROM {table}"
             if len(where_clause) > 1:
-                conditions = re.split(r"\s+AND\s+", where_clause[1].rstrip(";"), flags=re.IGNORECASE)
+                conditions = SQLFormatter.AND_KEYWORD_PATTERN.split(where_clause[1].rstrip(";"))
                 lines.append("WHERE")
             else:
                 return sql.strip()
@@ -662,7 +895,7 @@ class SQLFormatter:
         :param sql: The statement to collapse.
         :return: A single-line statement with no extra spaces.
         """
-        return re.sub(r"\s+", " ", sql.strip())
+        return " ".join(sql.split())
 
     @staticmethod
     def format_case_expression(sql: str) -> str:
@@ -673,26 +906,29 @@ class SQLFormatter:
         :param sql: An SQL snippet possibly containing a CASE expression.
         :return: The SQL with formatted CASE blocks.
         """
+        # Most statements have no CASE ... END at all; casefolded substring tests are far cheaper
+        # than letting CASE_BLOCK_PATTERN scan them case-insensitively
+        folded = sql.casefold()
+        case_at = folded.find("case")
+        if case_at == -1 or folded.find("end", case_at + 4) == -1:
+            return sql
+
         def _case_repl(match: re.Match) -> str:
             full_block = match.group(0)
             inner = full_block[4:-3].strip()
 
-            when_then_pairs = re.findall(
-                r"WHEN\s+(?P<cond>.+?)\s+THEN\s+(?P<res>.+?)(?=(?:WHEN|ELSE|$))",
-                inner,
-                flags=re.IGNORECASE | re.DOTALL,
-            )
-            else_match = re.search(r"ELSE\s+(?P<else>.+)$", inner, flags=re.IGNORECASE | re.DOTALL)
+            when_then_pairs = SQLFormatter.WHEN_THEN_PATTERN.findall(inner)
+            else_match = SQLFormatter.ELSE_PATTERN.search(inner)
 
             lines = ["CASE"]
             for cond, res in when_then_pairs:
                 cond = cond.strip()
                 res = res.strip()
-                in_match = re.match(r"(.+?\bIN)\s*\((.+)\)$", cond, flags=re.IGNORECASE | re.DOTALL)
+                in_match = SQLFormatter.IN_LIST_PATTERN.match(cond)
                 if in_match:
                     in_prefix = in_match.group(1).strip()
                     in_list = in_match.group(2).strip()
-                    items = [i.strip() for i in re.split(r",(?=(?:[^']*'[^']*')*[^']*$)", in_list)]
+                    items = SQLFormatter.smart_split_csv(in_list)
                     lines.append(f"    WHEN {in_prefix} (")
                     for j, item in enumerate(items):
                         comma = "," if j < len(items) - 1 else ""
@@ -708,7 +944,7 @@ class SQLFormatter:
             lines.append("END")
             return "\n".join(lines)
 
-        return re.sub(r"CASE\b.*?END\b", _case_repl, sql, flags=re.IGNORECASE | re.DOTALL)
+        return SQLFormatter.CASE_BLOCK_PATTERN.sub(_case_repl, sql)
 
     @staticmethod
     def smart_split_csv(s: str) -> List[str]:
@@ -719,58 +955,42 @@ class SQLFormatter:
         :return: A list of tokens.
         """
         parts = []
-        current_chars = []
-        in_single_quotes = False
-        in_double_quotes = False
-        escape_next_char = False
+        start = 0
         parentheses_level = 0
         brace_level = 0
         bracket_level = 0
 
-        for char in s:
-            if escape_next_char:
-                current_chars.append(char)
-                escape_next_char = False
-                continue
-            if char == "\\":
-                current_chars.append(char)
-                escape_next_char = True
-                continue
-            if char == "'" and not in_double_quotes:
-                in_single_quotes = not in_single_quotes
-                current_chars.append(char)
-                continue
-            if char == '"' and not in_single_quotes:
-                in_double_quotes = not in_double_quotes
-                current_chars.append(char)
-                continue
-            if not in_single_quotes and not in_double_quotes:
-                if char == "(":
-                    parentheses_level += 1
-                elif char == ")":
-                    if parentheses_level > 0:
-                        parentheses_level -= 1
-                elif char == "{":
-                    brace_level += 1
-                elif char == "}":
-                    if brace_level > 0:
-                        brace_level -= 1
-                elif char == "[":
-                    bracket_level += 1
-                elif char == "]":
-                    if bracket_level > 0:
-                        bracket_level -= 1
-                if (
-                    char == ","
-                    and parentheses_level == 0
-                    and brace_level == 0
-                    and bracket_level == 0
-                ):
-                    parts.append("".join(current_chars).strip())
-                    current_chars = []
-                    continue
-            current_chars.append(char)
-
-        if current_chars or (not parts and s.strip() != ""):
-            parts.append("".join(current_chars).strip())
-        return [p for p in parts if p]
+        # Quoted strings come back as single tokens, so the loop below only does real work
+        # on brackets and commas.
+        for token_m in SQLFormatter._csv_tokens(s):
+            token = token_m.group()
+            if token == "(":
+                parentheses_level += 1
+            elif token == ")":
+                if parentheses_level > 0:
+                    parentheses_level -= 1
+            elif token == "{":
+                brace_level += 1
+            elif token == "}":
+                if brace_level > 0:
+                    brace_level -= 1
+            elif token == "[":
+                bracket_level += 1
+            elif token == "]":
+                if bracket_level > 0:
+                    bracket_level -= 1
+            elif (
+                token == ","
+                and parentheses_level == 0
+                and brace_level == 0
+                and bracket_level == 0
+            ):
+                part = s[start:token_m.start()].strip()
+                if part:
+                    parts.append(part)
+                start = token_m.end()
+
+        tail = s[start:].strip()
+        if tail:
+            parts.append(tail)
+        return parts
@@ -1,14 +1,15 @@
 from PyQt5.Qsci import QsciScintilla, QsciLexerSQL
-from PyQt5.QtCore import Qt, QSettings
+from PyQt5.QtCore import Qt, QSettings, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
 from PyQt5.QtGui import QFont, QColor, QPalette
 from PyQt5.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QHBoxLayout,
+    QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QSizePolicy,
     QSplitter, QCheckBox, QDesktopWidget, QLineEdit
 )
 
 import SQLFormatter
 import re
+import traceback
 
 # Named constants for fonts and colors
 FONT_MONO = QFont("Courier New", 14)
@@ -55,6 +56,13 @@ DARK_LEXER_COLORS = {
     QsciLexerSQL.Default: COLOR_DARK_FG,
 }
 
+# Above this many characters the SQL lexer is detached; QScintilla styles the whole
+# buffer and freezes on multi-megabyte documents
+LARGE_TEXT_THRESHOLD = 512 * 1024
+
+# Format requests arriving within this many milliseconds of each other run once
+FORMAT_DEBOUNCE_MS = 150
+
 
 class DroppableQsciScintilla(QsciScintilla):
     def __init__(self, parent_app=None, *args, **kwargs):
@@ -90,7 +98,10 @@ class DroppableQsciScintilla(QsciScintilla):
                         if file_path.lower().endswith(('.sql', '.txt')):
                             with open(file_path, 'r', encoding='utf-8') as f:
                                 content = f.read()
-                            self.setText(content)
+                            if self.parent_app and hasattr(self.parent_app, 'set_editor_text'):
+                                self.parent_app.set_editor_text(self, content)
+                            else:
+                                self.setText(content)
                             event.acceptProposedAction()
                             if self.parent_app and hasattr(self.parent_app, 'format_sql_from_input'):
                                 self.parent_app.format_sql_from_input()
@@ -114,6 +125,34 @@ class DroppableQsciScintilla(QsciScintilla):
             super().dropEvent(event)
 
 
+class FormatSignals(QObject):
+    """
+    Carries a finished format back to the GUI thread as (request id, formatted text).
+    """
+    finished = pyqtSignal(int, str)
+
+
+class FormatWorker(QRunnable):
+    """
+    Runs one format request on a pool thread so a slow format does not freeze the window.
+    """
+
+    def __init__(self, request_id: int, signals: FormatSignals, format_fn, *args):
+        super().__init__()
+        self.request_id = request_id
+        self.signals = signals
+        self.format_fn = format_fn
+        self.args = args
+
+    def run(self):
+        try:
+            formatted_output = self.format_fn(*self.args)
+        except Exception as e:
+            formatted_output = f"❌ Critical error during formatting: {str(e)}\n\nPlease check the input SQL or report this bug."
+            print(f"CRITICAL FORMATTING ERROR: {traceback.format_exc()}")
+        self.signals.finished.emit(self.request_id, formatted_output)
+
+
 class SQLFormatterApp(QWidget):
     """
     A PyQt5-based GUI application that allows dragging in SQL/TXT files or pasting raw SQL,
@@ -134,10 +173,28 @@ class SQLFormatterApp(QWidget):
         self.input_lexer = None
         self.output_lexer = None
         self.settings = QSettings("AmeerJ", "SQLFormatterApp")
+        # (pattern text, compiled regex) of the last filter used, so reformatting skips re.compile
+        self._compiled_filter = None
+        # (cache file path, text) last read from or written to disk, so unchanged input is not rewritten
+        self._last_cached_input = None
+
+        # Formatting runs on a single pool thread, so SQLFormatter's caches are never used
+        # concurrently; only the result of the latest request is shown
+        self._format_request_id = 0
+        self._format_pool = QThreadPool(self)
+        self._format_pool.setMaxThreadCount(1)
+        self._format_signals = FormatSignals()
+        self._format_signals.finished.connect(self._show_formatted_output)
+        self._format_timer = QTimer(self)
+        self._format_timer.setSingleShot(True)
+        self._format_timer.setInterval(FORMAT_DEBOUNCE_MS)
+        self._format_timer.timeout.connect(self._do_format)
 
         self._setup_ui()
         self._load_cached_input()
-        if self.input_text.text().strip():
+        cached_sql = self.input_text.text()
+        # Formatting a very large cached input would hold up the first paint; leave it to Format
+        if cached_sql.strip() and len(cached_sql) <= LARGE_TEXT_THRESHOLD:
             self.format_sql_from_input()
 
         self.installEventFilter(self)
@@ -179,10 +236,11 @@ class SQLFormatterApp(QWidget):
         lexer.setDefaultFont(self.mono)
         lexer.setDefaultPaper(paper_color)
         lexer.setDefaultColor(default_fg)
-        for style_num in range(128):
-            lexer.setFont(self.mono, style_num)
-            lexer.setPaper(paper_color, style_num)
-            fg_color = token_color_map.get(style_num, default_fg)
+        # Style -1 applies to every style in one call; only the mapped tokens need their own color
+        lexer.setFont(self.mono, -1)
+        lexer.setPaper(paper_color, -1)
+        lexer.setColor(default_fg, -1)
+        for style_num, fg_color in token_color_map.items():
             lexer.setColor(fg_color, style_num)
 
     def _apply_editor_theme(self, editor, background: QColor, foreground: QColor,
@@ -191,6 +249,13 @@ class SQLFormatterApp(QWidget):
         """
         Apply a theme (light or dark) to a QsciScintilla editor instance.
         """
+        if editor.lexer() is None:
+            # Without a lexer the editor's own styles are shown; seed every style from the theme
+            editor.SendScintilla(QsciScintilla.SCI_STYLESETBACK, QsciScintilla.STYLE_DEFAULT, background)
+            editor.SendScintilla(QsciScintilla.SCI_STYLESETFORE, QsciScintilla.STYLE_DEFAULT, foreground)
+            editor.SendScintilla(QsciScintilla.SCI_STYLECLEARALL)
+            editor.setFont(self.mono)
+            editor.setMarginsFont(self.mono)
         pal = editor.palette()
         pal.setColor(QPalette.Base, background)
         pal.setColor(QPalette.Text, foreground)
@@ -203,6 +268,20 @@ class SQLFormatterApp(QWidget):
         editor.setSelectionBackgroundColor(selection_bg)
         editor.setSelectionForegroundColor(selection_fg)
 
+    def set_editor_text(self, editor: QsciScintilla, text: str):
+        """
+        Replace an editor's text, showing documents above LARGE_TEXT_THRESHOLD as plain text.
+        The SQL lexer is re-attached as soon as the editor is given normal-sized text again.
+        """
+        lexer = self.input_lexer if editor is self.input_text else self.output_lexer
+        wanted_lexer = lexer if len(text) <= LARGE_TEXT_THRESHOLD else None
+        if editor.lexer() is not wanted_lexer:
+            editor.setLexer(wanted_lexer)
+            if wanted_lexer is None:
+                # setLexer(None) resets every style, margins included, to black on white
+                self._apply_theme(editor, None)
+        editor.setText(text)
+
     def _save_splitter_state(self):
         """Save the current state of the splitter to settings."""
         self.settings.setValue("splitterState", self.splitter.saveState())
@@ -300,7 +379,9 @@ class SQLFormatterApp(QWidget):
     def _load_cached_input(self):
         try:
             with open(self.cache_file, "r", encoding="utf-8") as f:
-                self.input_text.setText(f.read())
+                cached_sql = f.read()
+            self.set_editor_text(self.input_text, cached_sql)
+            self._last_cached_input = (self.cache_file, cached_sql)
         except FileNotFoundError:
             return
         except Exception as e:
@@ -313,41 +394,46 @@ class SQLFormatterApp(QWidget):
                               (self.output_text, self.output_lexer)]:
             if not editor:
                 continue
-            if is_dark:
-                self._apply_editor_theme(
-                    editor,
-                    background=COLOR_DARK_BG,
-                    foreground=COLOR_DARK_FG,
-                    margins_bg=COLOR_DARK_MARGINS_BG,
-                    margins_fg=COLOR_DARK_MARGINS_FG,
-                    selection_bg=COLOR_DARK_SELECTION_BG,
-                    selection_fg=COLOR_DARK_SELECTION_FG,
-                )
-                self._apply_lexer_theme(
-                    lexer,
-                    paper_color=COLOR_DARK_BG,
-                    default_fg=COLOR_DARK_FG,
-                    token_color_map=DARK_LEXER_COLORS,
-                )
-            else:
-                self._apply_editor_theme(
-                    editor,
-                    background=COLOR_LIGHT_BG,
-                    foreground=COLOR_LIGHT_FG,
-                    margins_bg=COLOR_MARGINS_BG,
-                    margins_fg=COLOR_MARGINS_FG,
-                    selection_bg=COLOR_SELECTION_BG,
-                    selection_fg=COLOR_LIGHT_FG,
-                )
-                self._apply_lexer_theme(
-                    lexer,
-                    paper_color=COLOR_LIGHT_BG,
-                    default_fg=COLOR_LIGHT_FG,
-                    token_color_map=LIGHT_LEXER_COLORS,
-                )
-            editor.recolor()
+            self._apply_theme(editor, lexer)
+            # No recolor(): the lexer pushes style changes to the editor itself, and
+            # re-lexing the whole buffer only stalls the toggle on large documents
         self.toggle_wrap_mode(apply_only=True)
 
+    def _apply_theme(self, editor, lexer):
+        """Apply the theme selected by the Dark Mode checkbox to one editor and its lexer."""
+        if self.dark_mode_checkbox.isChecked():
+            self._apply_editor_theme(
+                editor,
+                background=COLOR_DARK_BG,
+                foreground=COLOR_DARK_FG,
+                margins_bg=COLOR_DARK_MARGINS_BG,
+                margins_fg=COLOR_DARK_MARGINS_FG,
+                selection_bg=COLOR_DARK_SELECTION_BG,
+                selection_fg=COLOR_DARK_SELECTION_FG,
+            )
+            self._apply_lexer_theme(
+                lexer,
+                paper_color=COLOR_DARK_BG,
+                default_fg=COLOR_DARK_FG,
+                token_color_map=DARK_LEXER_COLORS,
+            )
+        else:
+            self._apply_editor_theme(
+                editor,
+                background=COLOR_LIGHT_BG,
+                foreground=COLOR_LIGHT_FG,
+                margins_bg=COLOR_MARGINS_BG,
+                margins_fg=COLOR_MARGINS_FG,
+                selection_bg=COLOR_SELECTION_BG,
+                selection_fg=COLOR_LIGHT_FG,
+            )
+            self._apply_lexer_theme(
+                lexer,
+                paper_color=COLOR_LIGHT_BG,
+                default_fg=COLOR_LIGHT_FG,
+                token_color_map=LIGHT_LEXER_COLORS,
+            )
+
     def save_checkbox_states(self):
         self.settings.setValue("prettyJson", self.json_checkbox.isChecked())
 
@@ -358,15 +444,20 @@ class SQLFormatterApp(QWidget):
         """
         Apply the configured regex filter line-by-line so we can detect statement
         boundaries wherever the prefix appears.
-        Returns the filtered text and a list of booleans indicating which lines matched.
+        Returns the filtered text, a list of booleans indicating which lines matched,
+        and the filtered lines themselves so they need not be split again.
         """
         pattern = (self.filter_input.text() or "").strip()
         if not pattern:
-            return sql, None
-        try:
-            compiled = re.compile(pattern)
-        except re.error as exc:
-            raise ValueError(f"Invalid filter regex: {exc}") from exc
+            return sql, None, None
+        if self._compiled_filter and self._compiled_filter[0] == pattern:
+            compiled = self._compiled_filter[1]
+        else:
+            try:
+                compiled = re.compile(pattern)
+            except re.error as exc:
+                raise ValueError(f"Invalid filter regex: {exc}") from exc
+            self._compiled_filter = (pattern, compiled)
 
         filtered_lines = []
         match_flags = []
@@ -379,17 +470,20 @@ class SQLFormatterApp(QWidget):
             filtered_lines.append(new_line)
             match_flags.append(count > 0)
 
-        return "\n".join(filtered_lines), (match_flags if any_match else None)
+        return "\n".join(filtered_lines), (match_flags if any_match else None), filtered_lines
 
-    def _format_with_optional_chunks(self, sql_text: str, filter_flags, pretty: bool) -> str:
+    def _format_with_optional_chunks(self, sql_text: str, filter_flags, pretty: bool,
+                                     filtered_lines=None) -> str:
         """
         When filter_flags is provided, treat each line that matched the filter as the
         start of a new statement so log files with prefixed SQL still format correctly.
+        filtered_lines are the lines of sql_text as produced by _apply_filter, if available.
         """
         if not filter_flags:
             return SQLFormatter.SQLFormatter.format_all(sql_text, pretty_json=pretty)
 
-        filtered_lines = sql_text.splitlines()
+        if filtered_lines is None:
+            filtered_lines = sql_text.splitlines()
         if len(filtered_lines) != len(filter_flags):
             return SQLFormatter.SQLFormatter.format_all(sql_text, pretty_json=pretty)
 
@@ -417,45 +511,61 @@ class SQLFormatterApp(QWidget):
         return "\n\n".join(formatted_chunks)
 
     def format_sql_from_input(self):
+        # Requests in quick succession (held shortcut, repeated clicks) coalesce into one format
+        self._format_timer.start()
+
+    def _do_format(self):
         sql = self.input_text.text()
-        if sql.strip():
+        if sql.strip() and self._last_cached_input != (self.cache_file, sql):
             with open(self.cache_file, "w", encoding="utf-8") as f:
                 f.write(sql)
+            self._last_cached_input = (self.cache_file, sql)
 
+        # Any format still in flight is stale from here on, even if this one stops at the filter
+        self._format_request_id += 1
         try:
-            sql_to_format, filter_flags = self._apply_filter(sql)
+            sql_to_format, filter_flags, filtered_lines = self._apply_filter(sql)
         except ValueError as filter_error:
             self.error_label.setText(str(filter_error))
             self.error_label.setVisible(True)
             return
 
         pretty = self.json_checkbox.isChecked()
-        try:
-            formatted_output = self._format_with_optional_chunks(
-                sql_to_format,
-                filter_flags,
-                pretty,
-            )
-        except Exception as e:
-            formatted_output = f"❌ Critical error during formatting: {str(e)}\n\nPlease check the input SQL or report this bug."
-            import traceback
-            print(f"CRITICAL FORMATTING ERROR: {traceback.format_exc()}")
-
-        self.output_text.setText(formatted_output)
+        # A format that has not started yet is superseded by this one
+        self._format_pool.clear()
+        self._format_pool.start(FormatWorker(
+            self._format_request_id,
+            self._format_signals,
+            self._format_with_optional_chunks,
+            sql_to_format,
+            filter_flags,
+            pretty,
+            filtered_lines,
+        ))
+
+    def _show_formatted_output(self, request_id: int, formatted_output: str):
+        if request_id != self._format_request_id:
+            return
+        self.set_editor_text(self.output_text, formatted_output)
         self.error_label.setText("")
         self.error_label.setVisible(False)
 
     def eventFilter(self, obj, event):
         if event.type() == event.KeyPress and event.key() == Qt.Key_Return:
             if event.modifiers() & (Qt.ControlModifier | Qt.MetaModifier):
-                self.format_sql_from_input()
+                # Holding the shortcut down sends auto-repeat presses; format once per press
+                if not event.isAutoRepeat():
+                    self.format_sql_from_input()
                 return True
         return super().eventFilter(obj, event)
 
     def copy_output(self):
-        QApplication.clipboard().setText(self.output_text.text())
+        # Scintilla hands its buffer to the clipboard directly, without a Python str copy
+        self.output_text.SendScintilla(QsciScintilla.SCI_COPYRANGE, 0, self.output_text.length())
 
     def closeEvent(self, event):
+        self._format_timer.stop()
+        self._format_pool.clear()
         self.settings.setValue("windowGeometry", self.saveGeometry())
         super().closeEvent(event)
 
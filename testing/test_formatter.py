@@ -47,6 +47,51 @@ def test_format_insert_select_block_basic():
     assert out == expected
 
 
+def test_format_insert_select_block_table_name_containing_from():
+    sql = "INSERT INTO fromage(col1) SELECT a FROM bar;"
+    out = SQLFormatter.format_insert_select_block(sql)
+    assert out.endswith(") SELECT\n    a  -- col1\nFROM bar;")
+
+
+def test_top_level_comma_split_ignores_commas_in_nested_calls():
+    out = SQLFormatter.format_insert_select_block(
+        "INSERT INTO foo(x, y) SELECT COALESCE(a, LOWER(b)), c FROM bar;"
+    )
+    assert "    COALESCE(a, LOWER(b)),  -- x\n    c                       -- y\n" in out
+
+    out = SQLFormatter.format_create_table("CREATE TABLE t (a int, INDEX idx (a, LOWER(b)));")
+    assert out == "CREATE TABLE t (\n    a int,\n    INDEX idx (a, LOWER(b))\n);"
+
+
+def test_top_level_comma_split_ignores_brackets_and_commas_in_literals():
+    out = SQLFormatter.format_insert_select_block("INSERT INTO t(a,b) SELECT '(', x FROM z;")
+    assert "    '(',  -- a\n    x     -- b\n" in out
+
+    out = SQLFormatter.format_create_table("CREATE TABLE t (a varchar(5) DEFAULT '(', b int);")
+    assert out == "CREATE TABLE t (\n    a varchar(5) DEFAULT '(',\n    b int\n);"
+
+    out = SQLFormatter.format_create_table("CREATE TABLE t (a int COMMENT 'x, y', b int);")
+    assert out == "CREATE TABLE t (\n    a int COMMENT 'x, y',\n    b int\n);"
+
+
+def test_comma_splitters_share_the_statement_quoting_rule():
+    # 'C:\' never closes when the backslash escapes, so it is read literally
+    out = SQLFormatter.format_create_table("CREATE TABLE t (a varchar(5) DEFAULT 'C:\\', b int, c int);")
+    assert out == "CREATE TABLE t (\n    a varchar(5) DEFAULT 'C:\\',\n    b int,\n    c int\n);"
+
+    out = SQLFormatter.format_insert_select_block("INSERT INTO foo(x, y) SELECT 'C:\\', c FROM bar;")
+    assert "    'C:\\',  -- x\n    c       -- y\n" in out
+
+    out = SQLFormatter.format_insert_values_block("INSERT INTO foo(x, y) VALUES ('C:\\', 1);")
+    assert "        'C:\\', -- x\n        1       -- y\n" in out
+
+    # A backslash-escaped quote does not end the literal
+    out = SQLFormatter.format_create_table("CREATE TABLE t (a int COMMENT 'it\\'s, (x', b int);")
+    assert out == "CREATE TABLE t (\n    a int COMMENT 'it\\'s, (x',\n    b int\n);"
+
+    assert SQLFormatter.smart_split_csv("'O\\'Brien', 'a,b', 3") == ["'O\\'Brien'", "'a,b'", "3"]
+
+
 def test_extract_insert_statements():
     sql = """
     INSERT INTO t1(a) VALUES(1);
@@ -58,6 +103,21 @@ def test_extract_insert_statements():
     assert len(stmts) == 2
 
 
+def test_extract_insert_statements_does_not_span_statements():
+    sql = "INSERT INTO t1(a) SELECT a FROM q;\nINSERT INTO t2(b) VALUES(1);"
+    stmts = SQLFormatter.extract_insert_statements(sql)
+    assert sorted(stmts) == [
+        "INSERT INTO t1(a) SELECT a FROM q;",
+        "INSERT INTO t2(b) VALUES(1);",
+    ]
+
+    sql = "INSERT INTO t1(a) VALUES(1) ;\nINSERT INTO t2(b) VALUES(2);"
+    assert SQLFormatter.extract_insert_statements(sql) == [
+        "INSERT INTO t1(a) VALUES(1) ;",
+        "INSERT INTO t2(b) VALUES(2);",
+    ]
+
+
 def test_format_set_block_pure():
     sql = "SET @A = 1;\nSET @BB := 2;"
     out = SQLFormatter.format_set_block(sql)
@@ -71,6 +131,11 @@ def test_format_set_block_skip_json():
     assert out == sql
 
 
+def test_format_set_block_skip_non_set_line():
+    sql = "SET @A = 1;\nSELECT @A;"
+    assert SQLFormatter.format_set_block(sql) == sql
+
+
 def test_format_update_block_basic():
     sql = "UPDATE foo\nSET a = 1, b = 2\nWHERE id = 3;"
     out = SQLFormatter.format_update_block(sql)
@@ -82,6 +147,27 @@ def test_format_update_block_basic():
     assert lines[4].startswith("WHERE id = 3")
 
 
+def test_format_update_block_keeps_function_arguments_together():
+    sql = "UPDATE foo SET a = COALESCE(b, 'x,y'), c = 1 WHERE id = 3;"
+    lines = SQLFormatter.format_update_block(sql).splitlines()
+    assert lines[2] == "    a = COALESCE(b, 'x,y'),"
+    assert lines[3] == "    c = 1"
+
+
+def test_format_update_block_and_in_list_read_unclosable_backslash_literally():
+    lines = SQLFormatter.format_update_block("UPDATE t SET p = 'C:\\', q = 1 WHERE id = 2;").splitlines()
+    assert lines[2] == "    p = 'C:\\',"
+    assert lines[3] == "    q = 1"
+
+    out = SQLFormatter.format_case_expression("CASE WHEN a IN ('x\\', 'y') THEN 1 ELSE 0 END")
+    assert "    WHEN a IN (\n        'x\\',\n        'y'\n    ) THEN 1" in out
+
+
+def test_strip_block_comments_keeps_unclosed_comment():
+    assert SQLFormatter._strip_block_comments("(1 /* a */, 2/**/)") == "(1 , 2)"
+    assert SQLFormatter._strip_block_comments("(1) /* open") == "(1) /* open"
+
+
 def test_format_all_update_pretty_json_toggle():
     sql = "UPDATE foo\nSET json = '{\"x\":1, \"y\":2}'\nWHERE id = 1;"
     pretty = SQLFormatter.format_all(sql, pretty_json=True)
@@ -168,6 +254,104 @@ def test_format_all_mixed():
     assert "ADD col int;" in out
 
 
+def test_format_all_reuses_cached_result():
+    SQLFormatter.clear_format_cache()
+    sql = "UPDATE foo SET a = 1, b = 2 WHERE id = 3;"
+    first = SQLFormatter.format_all(sql)
+    assert SQLFormatter.format_all(sql) is first
+    assert SQLFormatter.format_all(sql, pretty_json=False) == first
+
+    SQLFormatter.clear_format_cache()
+    assert SQLFormatter.format_all(sql) is not first
+
+
+def test_insert_values_reuses_parsed_column_header():
+    SQLFormatter.clear_format_cache()
+    first = SQLFormatter.format_insert_values_block("INSERT INTO t (a, b) VALUES (1, 2);")
+    second = SQLFormatter.format_insert_values_block("INSERT INTO t (a, b) VALUES (3, 4);")
+    assert first.splitlines()[:4] == second.splitlines()[:4]
+    assert SQLFormatter._insert_values_header.cache_info().hits == 1
+
+    SQLFormatter.clear_format_cache()
+    assert SQLFormatter._insert_values_header.cache_info().currsize == 0
+
+
+def test_format_all_dispatches_on_leading_keyword():
+    sql = (
+        "insert into foo(col1) select a from bar;\n"
+        "delete from logs where id = 1 and kind = 2;\n"
+    )
+    out = SQLFormatter.format_all(sql)
+    assert ") SELECT\n    a  -- col1\nfrom bar;" in out
+    assert "DELETE FROM logs\nWHERE\n    id = 1\n    AND kind = 2;" in out
+
+
+def test_format_all_ignores_statement_end_inside_quotes_and_comments():
+    sql = (
+        "SELECT 'first;\nsecond' AS body FROM notes;\n"
+        "/* disabled;\n   DROP TABLE notes; */\n"
+        "DELETE FROM notes WHERE id = 2;\n"
+    )
+    assert SQLFormatter._split_statements(sql.strip()) == [
+        "SELECT 'first;\nsecond' AS body FROM notes",
+        "/* disabled;\n   DROP TABLE notes; */\nDELETE FROM notes WHERE id = 2;",
+    ]
+    out = SQLFormatter.format_all(sql)
+    assert "'first;\nsecond'" in out
+    assert out.count("\n\n") == 1
+
+
+def test_split_statements_honours_backslash_escaped_quotes():
+    sql = (
+        "INSERT INTO t(a) VALUES ('O\\'Brien');\n"
+        "INSERT INTO t(a) VALUES ('D\\'Arcy');\n"
+        "INSERT INTO t(a) VALUES ('x');"
+    )
+    assert SQLFormatter._split_statements(sql) == [
+        "INSERT INTO t(a) VALUES ('O\\'Brien')",
+        "INSERT INTO t(a) VALUES ('D\\'Arcy')",
+        "INSERT INTO t(a) VALUES ('x');",
+    ]
+
+    sql = (
+        "INSERT INTO t(a) VALUES ('a\\'b');\n"
+        "DELETE FROM t WHERE a = 1 AND b = 2;\n"
+        "UPDATE t SET c = 'd\\'e' WHERE id = 1;"
+    )
+    out = SQLFormatter.format_all(sql)
+    assert "    'a\\'b'  -- a" in out
+    assert "DELETE FROM t\nWHERE" in out
+    assert "    c = 'd\\'e'\nWHERE" in out
+
+
+def test_split_statements_reads_backslash_literally_when_escape_never_closes():
+    sql = "UPDATE t SET p = 'C:\\';\nDELETE FROM t WHERE a = 1 AND b = 2;"
+    assert SQLFormatter._split_statements(sql) == [
+        "UPDATE t SET p = 'C:\\'",
+        "DELETE FROM t WHERE a = 1 AND b = 2;",
+    ]
+    assert "DELETE FROM t\nWHERE" in SQLFormatter.format_all(sql)
+
+
+def test_split_statements_falls_back_on_unterminated_quote():
+    sql = "UPDATE t SET a = 'x;\nDELETE FROM t WHERE a = 1;\n/* open;\nDROP TABLE t;"
+    assert SQLFormatter._split_statements(sql) == [
+        "UPDATE t SET a = 'x",
+        "DELETE FROM t WHERE a = 1",
+        "/* open",
+        "DROP TABLE t;",
+    ]
+
+
+def test_split_statements_skips_hash_comments():
+    sql = "# don't do this;\nUPDATE t SET a = 1;\nDELETE FROM #tmp WHERE a = 1;\n"
+    assert SQLFormatter._split_statements(sql) == [
+        "# don't do this;\nUPDATE t SET a = 1",
+        "DELETE FROM #tmp WHERE a = 1",
+        "",
+    ]
+
+
 def test_insert_with_nested_functions():
     sql = "INSERT INTO foo(a, b) VALUES(FUNC(1, 2), 'text');"
     out = SQLFormatter.format_insert_values_block(sql)
@@ -190,6 +374,16 @@ def test_insert_with_comma_in_string():
     assert "'Doe, John'" in out
 
 
+def test_insert_rows_split_outside_strings_and_nested_parens():
+    sql = "INSERT INTO foo(a, b) VALUES('x), (y', COALESCE(1, (2))), ('z', 3);"
+    out = SQLFormatter.format_insert_values_block(sql)
+    assert "        'x), (y',        -- a\n        COALESCE(1, (2))  -- b\n    )\n" in out
+    assert "    ,(\n        'z', -- a\n        3     -- b\n    );" in out
+
+    bad = SQLFormatter.format_insert_values_block("INSERT INTO foo(a) VALUES(1) (2);")
+    assert bad.startswith("❌ Error parsing rows in VALUES.")
+
+
 def test_smart_split_csv_handles_double_quotes():
     text = 'print "Hello, world", next_val, func("NEW_DOCUMENT", thisUser)'
     parts = SQLFormatter.smart_split_csv(text)
@@ -206,13 +400,6 @@ def test_smart_split_csv_handles_json():
     assert parts == ['{"name":"x","vals":[1,2]}', "final"]
 
 
-def test_insert_with_quoted_identifiers():
-    sql = 'INSERT INTO "user"("select", "from") VALUES(1, 2);'
-    out = SQLFormatter.format_insert_values_block(sql)
-    assert '"select"' in out
-    assert '-- "select"' in out
-
-
 def test_format_all_with_comments_and_blank_lines():
     sql = """
 -- Add a new user
@@ -259,6 +446,43 @@ def test_embedded_json_without_quotes():
     assert "WHERE id = 5;" in out_pretty
 
 
+def test_embedded_json_skips_invalid_object_with_quoted_brace():
+    stmt = """UPDATE t SET a = '{"x": "}" bad}', b = '{"y":1}' WHERE id = 1;"""
+    out = SQLFormatter._format_embedded_json(stmt)
+    assert out.startswith("""UPDATE t SET a = '{"x": "}" bad}', b = '{\n    "y": 1\n}'""")
+
+
+def test_embedded_json_reuses_pretty_printed_payload(monkeypatch):
+    SQLFormatter.clear_format_cache()
+    payload = '{"a":1,"b":[2,3]}'
+    first = SQLFormatter._format_embedded_json(f"UPDATE t SET cfg = '{payload}' WHERE id = 1;")
+    assert SQLFormatter._pretty_json_cache[payload] in first
+
+    monkeypatch.setattr(
+        SQLFormatter.PRETTY_JSON_ENCODER, "encode", lambda obj: pytest.fail("payload re-encoded")
+    )
+    second = SQLFormatter._format_embedded_json(f"UPDATE t SET cfg = '{payload}' WHERE id = 2;")
+    assert second == first.replace("id = 1", "id = 2")
+    assert SQLFormatter.format_json_like_sql_field(payload) == SQLFormatter._pretty_json_cache[payload]
+
+
+@pytest.mark.skipif(
+    not hasattr(sys, "get_int_max_str_digits"), reason="int/str digit limit needs Python 3.11+"
+)
+def test_embedded_json_left_alone_when_json_loads_raises_value_error():
+    # json.loads raises a plain ValueError for integers past the int/str digit limit
+    huge = "9" * 5000
+    sql = f"""UPDATE config SET data = '{{"n":{huge}}}' WHERE id = 5;"""
+    out_pretty = SQLFormatter.format_all(sql, pretty_json=True)
+    assert f'{{"n":{huge}}}' in out_pretty
+    assert SQLFormatter.format_json_like_sql_field(f"[{huge}]") == f"[{huge}]"
+
+
+def test_format_json_like_sql_field_returns_non_text_unchanged():
+    assert SQLFormatter.format_json_like_sql_field(None) is None
+    assert SQLFormatter.format_json_like_sql_field("not json") == "not json"
+
+
 def test_insert_select_with_reserved_word():
     sql = "INSERT INTO results(id, `select`) SELECT 1, val FROM dummy;"
     out = SQLFormatter.format_insert_select_block(sql)
@@ -517,9 +741,20 @@ def test_format_case_expression_else_only():
     assert out.strip() == expected.strip()
 
 
+def test_format_case_expression_skips_statements_without_case():
+    sql = "SELECT id, name FROM users WHERE id = 1;"
+    assert SQLFormatter.format_case_expression(sql) is sql
+    unterminated = "SELECT CASE WHEN x = 1 THEN 'one' FROM t;"
+    assert SQLFormatter.format_case_expression(unterminated) is unterminated
+
+    lower = "select case when x = 1 then 'one' end col;"
+    assert "\n    WHEN x = 1 THEN 'one'\n" in SQLFormatter.format_case_expression(lower)
+
+
 def test_insert_with_quoted_identifiers():
     sql = 'INSERT INTO "user"("select", "from") VALUES(1, 2);'
     out = SQLFormatter.format_insert_values_block(sql)
+    assert '"select"' in out
     assert '-- "select"' in out and '-- "from"' in out
 
 
@@ -158,7 +158,7 @@ def test_drop_event_with_text_only():
 
 
 # --- Tests for SQLFormatterApp ---
-def test_format_sql_from_input(tmp_path, monkeypatch):
+def test_format_sql_from_input(tmp_path, monkeypatch, qtbot):
     app = gui_app.SQLFormatterApp()
     cache_file = tmp_path / "last_input.sql"
     app.cache_file = str(cache_file)
@@ -175,7 +175,8 @@ def test_format_sql_from_input(tmp_path, monkeypatch):
     app.filter_input.setText(r"^[^:]+:\s*")
     app.json_checkbox.setChecked(False)
 
-    app.format_sql_from_input()
+    with qtbot.waitSignal(app._format_signals.finished):
+        app.format_sql_from_input()
 
     assert captured["sql"] == "SELECT 2;"
     assert app.output_text.text() == "FORMATTED:SELECT 2;"
@@ -183,7 +184,7 @@ def test_format_sql_from_input(tmp_path, monkeypatch):
     assert app.error_label.text() == ""
 
 
-def test_format_sql_from_input_invalid_filter(tmp_path, monkeypatch):
+def test_format_sql_from_input_invalid_filter(tmp_path, monkeypatch, qtbot):
     app = gui_app.SQLFormatterApp()
     cache_file = tmp_path / "last_input.sql"
     app.cache_file = str(cache_file)
@@ -200,12 +201,13 @@ def test_format_sql_from_input_invalid_filter(tmp_path, monkeypatch):
     app.filter_input.setText("[")
 
     app.format_sql_from_input()
+    qtbot.waitUntil(lambda: app.error_label.text() != "")
 
     assert called["format"] is False
     assert "Invalid filter regex" in app.error_label.text()
 
 
-def test_log_filter_splits_statements(monkeypatch):
+def test_log_filter_splits_statements(monkeypatch, qtbot):
     app = gui_app.SQLFormatterApp()
 
     calls = []
@@ -222,7 +224,8 @@ def test_log_filter_splits_statements(monkeypatch):
         " MacBookPro.hsd1.az.comcast.net: CREATE TABLE foo(id INT);"
     )
 
-    app.format_sql_from_input()
+    with qtbot.waitSignal(app._format_signals.finished):
+        app.format_sql_from_input()
 
     assert len(calls) == 2
     assert calls[0].startswith("ALTER TABLE")
@@ -230,6 +233,42 @@ def test_log_filter_splits_statements(monkeypatch):
     assert app.output_text.text() == "FORMATTED:1\n\nFORMATTED:2"
 
 
+def test_log_filter_splits_statements_with_trailing_blank_line(monkeypatch, qtbot):
+    app = gui_app.SQLFormatterApp()
+
+    calls = []
+
+    def fake_format_all(sql_text, pretty_json=True):
+        calls.append(sql_text.strip())
+        return f"FORMATTED:{len(calls)}"
+
+    monkeypatch.setattr(gui_app.SQLFormatter.SQLFormatter, "format_all", fake_format_all)
+
+    app.filter_input.setText(r"^host:\s*")
+    app.input_text.setText("host: SELECT 1;\nhost: SELECT 2;\n\n")
+
+    with qtbot.waitSignal(app._format_signals.finished):
+        app.format_sql_from_input()
+
+    assert calls == ["SELECT 1;", "SELECT 2;"]
+
+
+def test_apply_filter_reuses_compiled_pattern(monkeypatch):
+    app = gui_app.SQLFormatterApp()
+    app.filter_input.setText(r"^host:\s*")
+    assert app._apply_filter("host: SELECT 1;")[:2] == ("SELECT 1;", [True])
+
+    compiled = app._compiled_filter[1]
+    monkeypatch.setattr(gui_app.re, "compile", lambda *a, **k: pytest.fail("filter recompiled"))
+    assert app._apply_filter("host: SELECT 2;")[:2] == ("SELECT 2;", [True])
+    assert app._compiled_filter[1] is compiled
+
+    monkeypatch.undo()
+    app.filter_input.setText(r"^db:\s*")
+    assert app._apply_filter("db: SELECT 3;")[:2] == ("SELECT 3;", [True])
+    assert app._compiled_filter[0] == r"^db:\s*"
+
+
 from PyQt5.Qsci import QsciScintilla
 
 def test_toggle_theme_changes_editor_background():
@@ -253,6 +292,20 @@ def test_toggle_theme_changes_editor_background():
     assert dark_bg != light_bg, f"Expected dark and light backgrounds to differ, got {dark_bg} both times"
 
 
+def test_toggle_theme_updates_editor_styles_without_recolor(monkeypatch):
+    app = gui_app.SQLFormatterApp()
+    monkeypatch.setattr(QsciScintilla, "recolor", lambda *a: pytest.fail("buffer re-lexed"))
+
+    app.dark_mode_checkbox.setChecked(True)
+    app.toggle_theme()
+    back = app.output_text.SendScintilla(QsciScintilla.SCI_STYLEGETBACK, gui_app.QsciLexerSQL.Keyword)
+    expected = gui_app.COLOR_DARK_BG
+    assert back == expected.red() | expected.green() << 8 | expected.blue() << 16
+
+    monkeypatch.undo()
+    app.dark_mode_checkbox.setChecked(False)
+
+
 def test_wrap_checkbox_controls_editors():
     app = gui_app.SQLFormatterApp()
     assert app.input_text.wrapMode() == gui_app.QsciScintilla.WrapNone
@@ -264,6 +317,71 @@ def test_wrap_checkbox_controls_editors():
     assert app.output_text.wrapMode() == gui_app.QsciScintilla.WrapWord
 
 
+def test_format_sql_from_input_skips_unchanged_cache_write(tmp_path, qtbot):
+    app = gui_app.SQLFormatterApp()
+    cache_file = tmp_path / "last_input.sql"
+    app.cache_file = str(cache_file)
+    app.input_text.setText("SELECT 1;")
+
+    def format_and_wait():
+        with qtbot.waitSignal(app._format_signals.finished):
+            app.format_sql_from_input()
+
+    format_and_wait()
+    assert cache_file.read_text() == "SELECT 1;"
+    cache_file.write_text("edited elsewhere")
+    format_and_wait()
+    assert cache_file.read_text() == "edited elsewhere"
+
+    app.input_text.setText("SELECT 2;")
+    format_and_wait()
+    assert cache_file.read_text() == "SELECT 2;"
+
+
+def test_format_sql_from_input_coalesces_rapid_requests(monkeypatch, qtbot):
+    app = gui_app.SQLFormatterApp()
+    calls = []
+
+    def fake_format_all(sql_text, pretty_json=True):
+        calls.append(sql_text)
+        return "FORMATTED:" + sql_text
+
+    monkeypatch.setattr(gui_app.SQLFormatter.SQLFormatter, "format_all", fake_format_all)
+    app.input_text.setText("SELECT 1;")
+
+    with qtbot.waitSignal(app._format_signals.finished):
+        for _ in range(3):
+            app.format_sql_from_input()
+    assert calls == ["SELECT 1;"]
+    assert app.output_text.text() == "FORMATTED:SELECT 1;"
+
+
+def test_stale_format_result_is_ignored():
+    app = gui_app.SQLFormatterApp()
+    app.output_text.setText("CURRENT")
+    app._format_request_id = 2
+
+    app._show_formatted_output(1, "STALE")
+    assert app.output_text.text() == "CURRENT"
+
+    app._show_formatted_output(2, "LATEST")
+    assert app.output_text.text() == "LATEST"
+
+
+def test_format_error_reported_from_worker(monkeypatch, qtbot):
+    app = gui_app.SQLFormatterApp()
+
+    def failing_format_all(sql_text, pretty_json=True):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(gui_app.SQLFormatter.SQLFormatter, "format_all", failing_format_all)
+    app.input_text.setText("SELECT 1;")
+
+    with qtbot.waitSignal(app._format_signals.finished):
+        app.format_sql_from_input()
+    assert "Critical error during formatting: boom" in app.output_text.text()
+
+
 def test_load_cached_input(tmp_path):
     cache_file = tmp_path / "last_input.sql"
     cache_file.write_text("TEST_INLINE;")
@@ -275,6 +393,51 @@ def test_load_cached_input(tmp_path):
     assert app.input_text.text() == "TEST_INLINE;"
 
 
+def test_large_output_shown_without_lexer(monkeypatch):
+    app = gui_app.SQLFormatterApp()
+    monkeypatch.setattr(gui_app, "LARGE_TEXT_THRESHOLD", 10)
+
+    app.set_editor_text(app.output_text, "SELECT 1234567890;")
+    assert app.output_text.lexer() is None
+    assert app.output_text.text() == "SELECT 1234567890;"
+
+    app.set_editor_text(app.output_text, "SELECT 1;")
+    assert app.output_text.lexer() is app.output_lexer
+
+
+def test_large_output_keeps_dark_theme_without_lexer(monkeypatch):
+    app = gui_app.SQLFormatterApp()
+    app.dark_mode_checkbox.setChecked(True)
+    monkeypatch.setattr(gui_app, "LARGE_TEXT_THRESHOLD", 10)
+    app.set_editor_text(app.output_text, "SELECT 1234567890;")
+
+    def scintilla_color(color):
+        return color.red() | color.green() << 8 | color.blue() << 16
+
+    editor = app.output_text
+    for style in (0, QsciScintilla.STYLE_DEFAULT):
+        back = editor.SendScintilla(QsciScintilla.SCI_STYLEGETBACK, style)
+        fore = editor.SendScintilla(QsciScintilla.SCI_STYLEGETFORE, style)
+        assert back == scintilla_color(gui_app.COLOR_DARK_BG)
+        assert fore == scintilla_color(gui_app.COLOR_DARK_FG)
+    margin_back = editor.SendScintilla(QsciScintilla.SCI_STYLEGETBACK, QsciScintilla.STYLE_LINENUMBER)
+    assert margin_back == scintilla_color(gui_app.COLOR_DARK_MARGINS_BG)
+
+    app.dark_mode_checkbox.setChecked(False)
+    back = editor.SendScintilla(QsciScintilla.SCI_STYLEGETBACK, QsciScintilla.STYLE_DEFAULT)
+    assert back == scintilla_color(gui_app.COLOR_LIGHT_BG)
+
+
+def test_large_cached_input_not_formatted_on_startup(monkeypatch):
+    monkeypatch.setattr(gui_app, "LARGE_TEXT_THRESHOLD", 5)
+    monkeypatch.setattr(
+        gui_app.SQLFormatterApp, "_load_cached_input", lambda self: self.input_text.setText("SELECT 1;")
+    )
+    app = gui_app.SQLFormatterApp()
+    assert app.input_text.text() == "SELECT 1;"
+    assert app.output_text.text() == ""
+
+
 def test_event_filter_ctrl_enter(monkeypatch):
     app = gui_app.SQLFormatterApp()
     called = []
@@ -289,20 +452,15 @@ def test_event_filter_ctrl_enter(monkeypatch):
     assert handled is True
     assert called == [True]
 
+    repeat = QKeyEvent(QKeyEvent.KeyPress, Qt.Key_Return, Qt.ControlModifier, "", True)
+    assert app.eventFilter(None, repeat) is True
+    assert called == [True]
 
-def test_copy_output_to_clipboard(monkeypatch):
-    app = gui_app.SQLFormatterApp()
-    app.output_text.setText("COPY_ME;")
-
-    class FakeClipboard:
-        def __init__(self):
-            self.data = ""
-
-        def setText(self, text):
-            self.data = text
 
-    fake_clip = FakeClipboard()
-    monkeypatch.setattr(QApplication, "clipboard", lambda: fake_clip)
+def test_copy_output_to_clipboard():
+    app = gui_app.SQLFormatterApp()
+    app.output_text.setText("COPY_ME; -- é")
+    QApplication.clipboard().setText("")
 
     app.copy_output()
-    assert fake_clip.data == "COPY_ME;"
+    assert QApplication.clipboard().text() == "COPY_ME; -- é"